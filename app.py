@@ -1,14 +1,19 @@
-from flask import Flask, request, jsonify, render_template, send_file, abort
+from quart import Quart, request, jsonify, render_template, abort, Response
 from werkzeug.utils import secure_filename
+import asyncio
+import hmac
+import json
 import os
 import logging
+import uuid
+import numpy as np
 from datetime import datetime, date
-import io
 import tempfile
+from sqlalchemy import func, text
 from config import Config
 from models import Student, Pass, LoadSession
 from db import get_db_session
-from face_utils import face_engine
+from face_utils import face_engine, serialize_encoding
 from loader import ExcelLoader
 import xlsxwriter
 
@@ -23,19 +28,90 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+app = Quart(__name__)
 app.config['SECRET_KEY'] = Config.SECRET_KEY
 app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
 
 # Create upload folder
 os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
 
-def require_admin_token():
-    """Decorator to require admin token for protected endpoints"""
-    token = request.headers.get('Authorization') or request.args.get('token') or request.form.get('token')
-    if not token or token != Config.ADMIN_TOKEN:
+@app.before_request
+async def check_admin_token():
+    """Authenticate /admin/ endpoints before any view work happens"""
+    if not request.path.startswith('/admin/'):
+        return
+    form = await request.form
+    token = request.headers.get('Authorization') or request.args.get('token') or form.get('token')
+    # Compare as bytes: compare_digest raises TypeError on non-ASCII
+    # str input, which would turn a bad token into a 500
+    if not token or not hmac.compare_digest(token.encode('utf-8'),
+                                            Config.ADMIN_TOKEN.encode('utf-8')):
         abort(401, description="Invalid or missing admin token")
 
+class RecognitionCoalescer:
+    """
+    Micro-batches concurrent recognition queries into one index search.
+    Requests arriving within a short window are stacked into a single matrix
+    so the fixed per-search overhead is paid once per batch, not per query.
+    """
+
+    def __init__(self, batch_max=None, window_ms=None):
+        self.batch_max = batch_max or Config.RECOGNIZE_BATCH_MAX
+        self.window = (window_ms or Config.RECOGNIZE_BATCH_WINDOW_MS) / 1000.0
+        self.queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, encoding):
+        """Submit one encoding for matching; resolves to (student_id, distance)"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((encoding, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Block for the first query, then collect more until the batch
+            # is full or the window expires
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.batch_max:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            matrix = np.stack([encoding for encoding, _ in batch])
+            try:
+                results = await asyncio.to_thread(face_engine.find_matching_student_batch, matrix)
+            except Exception as e:
+                logger.error(f"Error in recognition batch search: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+recognition_coalescer = RecognitionCoalescer()
+
 def init_face_engine():
     """Initialize face recognition engine"""
     db = get_db_session()
@@ -44,124 +120,148 @@ def init_face_engine():
         if not face_engine.load_embeddings_cache():
             logger.info("No embeddings cache found, building from database...")
             face_engine.rebuild_index(db)
+        face_engine.load_today_passes(db)
     except Exception as e:
         logger.error(f"Error initializing face engine: {e}")
     finally:
         db.close()
 
 @app.route('/')
-def index():
+async def index():
     """Main page with camera interface"""
-    return render_template('index.html')
+    return await render_template('index.html')
 
 @app.route('/admin')
-def admin_panel():
+async def admin_panel():
     """Admin panel for system management"""
-    return render_template('admin.html')
+    return await render_template('admin.html')
+
+def _record_recognition(student_id, distance):
+    """
+    Fetch student data and record the pass (blocking DB work)
+    Returns: (payload_dict, http_status)
+    """
+    db = get_db_session()
+    try:
+        student = db.query(Student).filter_by(id=student_id).first()
+        if not student:
+            logger.error(f"Student not found in database: student_id={student_id}")
+            return {
+                'status': 'error',
+                'message': 'Ошибка получения данных студента'
+            }, 500
+
+        # Check if student already passed today: O(1) in-process set first,
+        # then the EXISTS probe against ix_pass_student_day
+        today = date.today()
+        if face_engine.has_passed_today(student_id):
+            already_passed = True
+        else:
+            try:
+                already_passed = db.query(
+                    db.query(Pass).filter(
+                        Pass.student_id == student_id,
+                        func.date(Pass.timestamp) == today
+                    ).exists()
+                ).scalar()
+            except Exception as e:
+                logger.error(f"Error checking existing pass for student {student_id}: {e}")
+                db.rollback()
+                return {
+                    'status': 'error',
+                    'message': 'Ошибка проверки предыдущих проходов'
+                }, 500
+            if already_passed:
+                face_engine.mark_passed_today(student_id)
+
+        if already_passed:
+            # Only the already-passed response needs the actual row
+            existing_pass = db.query(Pass).filter(
+                Pass.student_id == student_id,
+                func.date(Pass.timestamp) == today
+            ).order_by(Pass.timestamp).first()
+            if existing_pass:
+                return {
+                    'status': 'already_passed',
+                    'message': f'Студент уже проходил сегодня в {existing_pass.timestamp.strftime("%H:%M:%S")}',
+                    'student': student.to_dict(),
+                    'first_pass_time': existing_pass.timestamp.isoformat(),
+                    'confidence': f'{distance:.4f}'
+                }, 200
+
+        # Record new pass
+        try:
+            new_pass = Pass(
+                student_id=student_id,
+                timestamp=datetime.utcnow(),
+                source='camera',
+                confidence=f'{distance:.4f}'
+            )
+            db.add(new_pass)
+            db.commit()
+            face_engine.mark_passed_today(student_id)
+
+            return {
+                'status': 'ok',
+                'message': 'Студент успешно идентифицирован',
+                'student': student.to_dict(),
+                'pass_time': new_pass.timestamp.isoformat(),
+                'confidence': f'{distance:.4f}'
+            }, 200
+        except Exception as e:
+            logger.error(f"Error creating new pass for student {student_id}: {e}")
+            db.rollback()
+            return {
+                'status': 'error',
+                'message': 'Ошибка записи прохода'
+            }, 500
+
+    finally:
+        db.close()
 
 @app.route('/api/recognize', methods=['POST'])
-def recognize_face():
+async def recognize_face():
     """Recognize face from uploaded image"""
     try:
-        if 'image' not in request.files:
+        files = await request.files
+        if 'image' not in files:
             return jsonify({'error': 'No image file provided'}), 400
-        
-        file = request.files['image']
+
+        file = files['image']
         if file.filename == '':
             return jsonify({'error': 'No image file selected'}), 400
-        
-        # Read image data
-        image_data = file.read()
-        
-        # Extract face encoding
-        encoding, num_faces = face_engine.process_uploaded_image(image_data)
-        
+
+        # Extract face encoding in a worker thread (dlib is CPU-heavy and
+        # would otherwise block the event loop for every request); the
+        # engine reads the spooled upload off the event loop, so the
+        # payload copy happens on the worker thread too
+        encoding, num_faces = await asyncio.to_thread(face_engine.process_uploaded_image, file.stream)
+
         if encoding is None:
             return jsonify({
                 'status': 'not_found',
                 'message': 'Лицо не найдено на изображении'
             })
-        
+
         if num_faces > 1:
             return jsonify({
                 'status': 'error',
                 'message': f'Найдено несколько лиц ({num_faces}). Пожалуйста, сделайте фото с одним лицом.'
             }), 400
-        
-        # Find matching student
-        student_id, distance = face_engine.find_matching_student(encoding)
-        
+
+        # Find matching student (coalesced with other in-flight queries)
+        student_id, distance = await recognition_coalescer.submit(encoding)
+
         if student_id is None:
             return jsonify({
                 'status': 'not_found',
                 'message': 'Лицо не найдено в базе данных'
             })
-        
-        # Get student data
-        db = get_db_session()
-        try:
-            student = db.query(Student).filter_by(id=student_id).first()
-            if not student:
-                logger.error(f"Student not found in database: student_id={student_id}")
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Ошибка получения данных студента'
-                }), 500
-            
-            # Check if student already passed today
-            today = date.today()
-            try:
-                existing_pass = db.query(Pass).filter(
-                    Pass.student_id == student_id,
-                    Pass.timestamp >= datetime.combine(today, datetime.min.time()),
-                    Pass.timestamp < datetime.combine(today, datetime.max.time())
-                ).first()
-            except Exception as e:
-                logger.error(f"Error checking existing pass for student {student_id}: {e}")
-                db.rollback()
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Ошибка проверки предыдущих проходов'
-                }), 500
-            
-            if existing_pass:
-                return jsonify({
-                    'status': 'already_passed',
-                    'message': f'Студент уже проходил сегодня в {existing_pass.timestamp.strftime("%H:%M:%S")}',
-                    'student': student.to_dict(),
-                    'first_pass_time': existing_pass.timestamp.isoformat(),
-                    'confidence': f'{distance:.4f}'
-                })
-            
-            # Record new pass
-            try:
-                new_pass = Pass(
-                    student_id=student_id,
-                    timestamp=datetime.utcnow(),
-                    source='camera',
-                    confidence=f'{distance:.4f}'
-                )
-                db.add(new_pass)
-                db.commit()
-                
-                return jsonify({
-                    'status': 'ok',
-                    'message': 'Студент успешно идентифицирован',
-                    'student': student.to_dict(),
-                    'pass_time': new_pass.timestamp.isoformat(),
-                    'confidence': f'{distance:.4f}'
-                })
-            except Exception as e:
-                logger.error(f"Error creating new pass for student {student_id}: {e}")
-                db.rollback()
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Ошибка записи прохода'
-                }), 500
-            
-        finally:
-            db.close()
-    
+
+        # Record the pass off the event loop
+        payload, status = await asyncio.to_thread(_record_recognition, student_id, distance)
+        return jsonify(payload), status
+
     except Exception as e:
         logger.error(f"Error in recognize_face: {e}")
         return jsonify({
@@ -170,30 +270,30 @@ def recognize_face():
         }), 500
 
 @app.route('/admin/load_excel', methods=['POST'])
-def load_excel_endpoint():
+async def load_excel_endpoint():
     """Load students from Excel file via HTTP endpoint"""
-    require_admin_token()
-    
     try:
-        excel_path = request.form.get('excel_path', Config.EXCEL_FILE_PATH)
-        force = request.form.get('force', 'false').lower() == 'true'
-        
+        form = await request.form
+        excel_path = form.get('excel_path', Config.EXCEL_FILE_PATH)
+        force = form.get('force', 'false').lower() == 'true'
+
         # If file is uploaded
-        if 'excel_file' in request.files:
-            file = request.files['excel_file']
+        files = await request.files
+        if 'excel_file' in files:
+            file = files['excel_file']
             if file.filename != '':
                 filename = secure_filename(file.filename)
                 excel_path = os.path.join(Config.UPLOAD_FOLDER, filename)
                 file.save(excel_path)
-        
+
         loader = ExcelLoader()
-        load_session = loader.load_from_excel(excel_path, force=force)
-        
+        load_session = await asyncio.to_thread(loader.load_from_excel, excel_path, force)
+
         return jsonify({
             'status': 'success',
             'load_session': load_session.to_dict()
         })
-    
+
     except Exception as e:
         logger.error(f"Error in load_excel_endpoint: {e}")
         return jsonify({
@@ -201,28 +301,36 @@ def load_excel_endpoint():
             'message': str(e)
         }), 500
 
-@app.route('/admin/export_report', methods=['GET'])
-def export_report():
-    """Export attendance report as Excel file"""
-    require_admin_token()
-    
+def _generate_report_file(start_date, end_date):
+    """
+    Build the attendance report workbook on disk (blocking DB + xlsx work)
+    Returns: path of the generated tempfile
+    """
+    db = get_db_session()
     try:
-        db = get_db_session()
-        
-        # Get all passes with student data
-        query = db.query(Pass, Student).join(Student, Pass.student_id == Student.id)
-        
+        # Select only the report columns as lightweight tuples; full ORM
+        # rows would drag every column plus identity-map bookkeeping along
+        query = db.query(
+            Student.matricula,
+            Student.lastname,
+            Student.firstname,
+            Student.group_name,
+            Student.identifier,
+            Pass.timestamp,
+            Student.passport_number,
+            Student.date_of_birth,
+            Pass.source,
+            Pass.confidence
+        ).select_from(Pass).join(Student, Pass.student_id == Student.id)
+
         # Optional date filtering
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        
         if start_date:
             try:
                 start_dt = datetime.strptime(start_date, '%Y-%m-%d')
                 query = query.filter(Pass.timestamp >= start_dt)
             except ValueError:
                 pass
-        
+
         if end_date:
             try:
                 end_dt = datetime.strptime(end_date, '%Y-%m-%d')
@@ -230,83 +338,192 @@ def export_report():
                 query = query.filter(Pass.timestamp <= end_dt)
             except ValueError:
                 pass
-        
-        passes = query.order_by(Pass.timestamp.desc()).all()
-        
-        # Create Excel file in memory
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+
+        query = query.order_by(Pass.timestamp.desc())
+
+        # Create Excel file on disk in constant-memory mode so row data is
+        # flushed as it is written instead of being buffered per worksheet
+        tmp = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+        tmp.close()
+        workbook = xlsxwriter.Workbook(tmp.name, {'constant_memory': True})
         worksheet = workbook.add_worksheet('Attendance Report')
-        
+
+        # One shared cell format; timestamps are stored as native Excel
+        # serial dates (sortable/filterable) instead of strftime strings
+        date_fmt = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+
         # Headers
         headers = [
             'Matricula', 'Lastname', 'Firstname', 'Group', 'Идентификатор',
             'DateTime of pass', 'Passport number', 'Date of birth', 'Source', 'Confidence'
         ]
-        
+
         # Write headers
-        for col, header in enumerate(headers):
-            worksheet.write(0, col, header)
-        
-        # Write data
-        for row, (pass_record, student) in enumerate(passes, 1):
-            worksheet.write(row, 0, student.matricula or '')
-            worksheet.write(row, 1, student.lastname or '')
-            worksheet.write(row, 2, student.firstname or '')
-            worksheet.write(row, 3, student.group_name or '')
-            worksheet.write(row, 4, student.identifier or '')
-            worksheet.write(row, 5, pass_record.timestamp.strftime('%Y-%m-%d %H:%M:%S') if pass_record.timestamp else '')
-            worksheet.write(row, 6, student.passport_number or '')
-            worksheet.write(row, 7, student.date_of_birth or '')
-            worksheet.write(row, 8, pass_record.source or '')
-            worksheet.write(row, 9, pass_record.confidence or '')
-        
+        worksheet.write_row(0, 0, headers)
+
+        # Write data, fetching rows in batches instead of loading all at once;
+        # one write_row call per record instead of ten per-cell writes
+        for row_num, row in enumerate(query.yield_per(1000), 1):
+            worksheet.write_row(row_num, 0, (
+                row.matricula or '',
+                row.lastname or '',
+                row.firstname or '',
+                row.group_name or '',
+                row.identifier or ''
+            ))
+            if row.timestamp:
+                worksheet.write_datetime(row_num, 5, row.timestamp, date_fmt)
+            worksheet.write_row(row_num, 6, (
+                row.passport_number or '',
+                row.date_of_birth or '',
+                row.source or '',
+                row.confidence or ''
+            ))
+
         workbook.close()
-        output.seek(0)
-        
-        # Generate filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'attendance_report_{timestamp}.xlsx'
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-    
+        return tmp.name
+
+    finally:
+        db.close()
+
+async def _stream_report_file(path):
+    """Stream a generated report file in chunks, removing it afterwards"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, 65536)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _report_response(path):
+    """Build the streaming download response for a generated report"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f'attendance_report_{timestamp}.xlsx'
+
+    return Response(
+        _stream_report_file(path),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route('/admin/export_report', methods=['GET'])
+async def export_report():
+    """Export attendance report as Excel file"""
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+
+        # Build the workbook off the event loop
+        report_path = await asyncio.to_thread(_generate_report_file, start_date, end_date)
+
+        return _report_response(report_path)
+
     except Exception as e:
         logger.error(f"Error in export_report: {e}")
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 500
-    
-    finally:
-        db.close()
 
-@app.route('/admin/stats', methods=['GET'])
-def admin_stats():
-    """Get system statistics"""
-    require_admin_token()
-    
+# Export job state lives on disk next to the report tempfiles so that
+# under gunicorn any worker can answer a poll for a job that a
+# different worker started; tiny JSON files, one per job
+EXPORT_JOBS_DIR = 'data/export_jobs'
+
+def _export_job_path(job_id):
+    return os.path.join(EXPORT_JOBS_DIR, f'{job_id}.json')
+
+def _write_export_job(job_id, state):
+    """Persist job state atomically (write-then-rename)"""
+    os.makedirs(EXPORT_JOBS_DIR, exist_ok=True)
+    tmp_path = _export_job_path(job_id) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, _export_job_path(job_id))
+
+def _read_export_job(job_id):
+    try:
+        with open(_export_job_path(job_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _drop_export_job(job_id):
+    try:
+        os.remove(_export_job_path(job_id))
+    except OSError:
+        pass
+
+async def _run_export_job(job_id, start_date, end_date):
+    """Generate a report in the background and record the outcome"""
+    try:
+        path = await asyncio.to_thread(_generate_report_file, start_date, end_date)
+        _write_export_job(job_id, {'status': 'finished', 'path': path, 'error': None})
+    except Exception as e:
+        logger.error(f"Error in export job {job_id}: {e}")
+        _write_export_job(job_id, {'status': 'failed', 'path': None, 'error': str(e)})
+
+@app.route('/admin/export_report/start', methods=['POST'])
+async def export_report_start():
+    """Start report generation in the background, returning a job id"""
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+
+    job_id = uuid.uuid4().hex
+    _write_export_job(job_id, {'status': 'running', 'path': None, 'error': None})
+    app.add_background_task(_run_export_job, job_id, start_date, end_date)
+
+    return jsonify({'status': 'accepted', 'job_id': job_id}), 202
+
+@app.route('/admin/export_report/<job_id>', methods=['GET'])
+async def export_report_result(job_id):
+    """Poll a background export job; downloads the file once finished"""
+    # job ids are uuid4 hex; reject anything else before it reaches the
+    # filesystem
+    job = _read_export_job(job_id) if job_id.isalnum() else None
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job id'}), 404
+
+    if job['status'] == 'running':
+        return jsonify({'status': 'running', 'job_id': job_id}), 202
+
+    if job['status'] == 'failed':
+        _drop_export_job(job_id)
+        return jsonify({'status': 'error', 'message': job['error']}), 500
+
+    # Finished: the response stream removes the tempfile when done
+    _drop_export_job(job_id)
+    return _report_response(job['path'])
+
+def _collect_stats():
+    """Gather system statistics (blocking DB work)"""
+    db = get_db_session()
     try:
-        db = get_db_session()
-        
-        # Get counts
-        total_students = db.query(Student).count()
-        total_passes = db.query(Pass).count()
-        today_passes = db.query(Pass).filter(
-            Pass.timestamp >= datetime.combine(date.today(), datetime.min.time())
-        ).count()
-        
+        # Get all three counts in one round trip; the today subquery
+        # references date(timestamp) so the planner can use ix_pass_date
+        total_students, total_passes, today_passes = db.execute(
+            text(
+                "SELECT "
+                "(SELECT COUNT(*) FROM students), "
+                "(SELECT COUNT(*) FROM passes), "
+                "(SELECT COUNT(*) FROM passes WHERE date(timestamp) = :today)"
+            ),
+            {'today': date.today().isoformat()}
+        ).one()
+
         # Get face engine stats
         face_stats = face_engine.get_stats()
-        
+
         # Get recent load sessions
         recent_loads = db.query(LoadSession).order_by(LoadSession.started_at.desc()).limit(5).all()
-        
-        return jsonify({
+
+        return {
             'students': {
                 'total': total_students,
                 'with_encodings': face_stats['total_embeddings']
@@ -317,27 +534,38 @@ def admin_stats():
             },
             'face_engine': face_stats,
             'recent_loads': [load.to_dict() for load in recent_loads]
-        })
-    
+        }
+    finally:
+        db.close()
+
+@app.route('/admin/stats', methods=['GET'])
+async def admin_stats():
+    """Get system statistics"""
+    try:
+        stats = await asyncio.to_thread(_collect_stats)
+        return jsonify(stats)
+
     except Exception as e:
         logger.error(f"Error in admin_stats: {e}")
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 500
-    
+
+def _rebuild_index():
+    """Rebuild the face recognition index (blocking DB + numpy work)"""
+    db = get_db_session()
+    try:
+        return face_engine.rebuild_index(db)
     finally:
         db.close()
 
 @app.route('/admin/rebuild_index', methods=['POST'])
-def rebuild_index():
+async def rebuild_index():
     """Rebuild face recognition index"""
-    require_admin_token()
-    
     try:
-        db = get_db_session()
-        success = face_engine.rebuild_index(db)
-        
+        success = await asyncio.to_thread(_rebuild_index)
+
         if success:
             return jsonify({
                 'status': 'success',
@@ -349,95 +577,104 @@ def rebuild_index():
                 'status': 'error',
                 'message': 'Failed to rebuild index'
             }), 500
-    
+
     except Exception as e:
         logger.error(f"Error in rebuild_index: {e}")
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 500
-    
+
+def _create_student(form, image_data):
+    """Create a new student record (blocking DB + face work)
+    Returns: (payload_dict, http_status)
+    """
+    matricula = form.get('matricula')
+    db = get_db_session()
+    try:
+        # Check if student already exists
+        existing = db.query(Student).filter(
+            (Student.matricula == matricula) |
+            (Student.identifier == form.get('identifier'))
+        ).first()
+
+        if existing:
+            return {
+                'status': 'error',
+                'message': 'Студент с такой матрикулой или идентификатором уже существует'
+            }, 400
+
+        # Create new student
+        student = Student(
+            matricula=matricula,
+            lastname=form.get('lastname'),
+            firstname=form.get('firstname'),
+            lotin=form.get('lotin', ''),
+            short=form.get('short', ''),
+            group_name=form.get('group_name', ''),
+            identifier=form.get('identifier', ''),
+            date_of_birth=form.get('date_of_birth', ''),
+            passport_number=form.get('passport_number', '')
+        )
+
+        # Handle photo upload if provided
+        encoding = None
+        if image_data:
+            # Process photo and extract face encoding
+            try:
+                encoding, num_faces = face_engine.process_uploaded_image(image_data)
+
+                if encoding is not None and num_faces == 1:
+                    student.face_encoding = serialize_encoding(encoding)
+                    logger.info(f"Face encoding extracted for new student {matricula}")
+                else:
+                    logger.warning(f"Could not extract face encoding for new student {matricula}: faces={num_faces}")
+            except Exception as e:
+                logger.error(f"Error processing photo for student {matricula}: {e}")
+
+        db.add(student)
+        db.commit()
+
+        # Rebuild face recognition index if face encoding was added
+        if student.face_encoding:
+            # Keep the columnar store in sync so the rebuild reads the
+            # new encoding without a table scan
+            if encoding is not None:
+                face_engine.append_to_encoding_store([student.id], [encoding])
+            face_engine.rebuild_index(db)
+
+        return {
+            'status': 'success',
+            'message': 'Студент добавлен успешно',
+            'student_id': student.id
+        }, 200
+
     finally:
         db.close()
 
 @app.route('/admin/add_student', methods=['POST'])
-def add_student():
+async def add_student():
     """Add a new student via admin interface"""
-    require_admin_token()
-    
     try:
         # Get form data
-        matricula = request.form.get('matricula')
-        lastname = request.form.get('lastname')
-        firstname = request.form.get('firstname')
-        
-        if not all([matricula, lastname, firstname]):
+        form = await request.form
+        if not all([form.get('matricula'), form.get('lastname'), form.get('firstname')]):
             return jsonify({
                 'status': 'error',
                 'message': 'Матрикула, фамилия и имя обязательны'
             }), 400
-        
-        db = get_db_session()
-        try:
-            # Check if student already exists
-            existing = db.query(Student).filter(
-                (Student.matricula == matricula) | 
-                (Student.identifier == request.form.get('identifier'))
-            ).first()
-            
-            if existing:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Студент с такой матрикулой или идентификатором уже существует'
-                }), 400
-            
-            # Create new student
-            student = Student(
-                matricula=matricula,
-                lastname=lastname,
-                firstname=firstname,
-                lotin=request.form.get('lotin', ''),
-                short=request.form.get('short', ''),
-                group_name=request.form.get('group_name', ''),
-                identifier=request.form.get('identifier', ''),
-                date_of_birth=request.form.get('date_of_birth', ''),
-                passport_number=request.form.get('passport_number', '')
-            )
-            
-            # Handle photo upload if provided
-            if 'photo' in request.files:
-                photo_file = request.files['photo']
-                if photo_file.filename != '':
-                    # Process photo and extract face encoding
-                    try:
-                        image_data = photo_file.read()
-                        encoding, num_faces = face_engine.process_uploaded_image(image_data)
-                        
-                        if encoding is not None and num_faces == 1:
-                            import pickle
-                            student.face_encoding = pickle.dumps(encoding)
-                            logger.info(f"Face encoding extracted for new student {matricula}")
-                        else:
-                            logger.warning(f"Could not extract face encoding for new student {matricula}: faces={num_faces}")
-                    except Exception as e:
-                        logger.error(f"Error processing photo for student {matricula}: {e}")
-            
-            db.add(student)
-            db.commit()
-            
-            # Rebuild face recognition index if face encoding was added
-            if student.face_encoding:
-                face_engine.rebuild_index(db)
-            
-            return jsonify({
-                'status': 'success',
-                'message': 'Студент добавлен успешно',
-                'student_id': student.id
-            })
-            
-        finally:
-            db.close()
-    
+
+        # Read photo data up front so the blocking helper never touches the request
+        image_data = None
+        files = await request.files
+        if 'photo' in files:
+            photo_file = files['photo']
+            if photo_file.filename != '':
+                image_data = photo_file.read()
+
+        payload, status = await asyncio.to_thread(_create_student, form, image_data)
+        return jsonify(payload), status
+
     except Exception as e:
         logger.error(f"Error in add_student: {e}")
         return jsonify({
@@ -446,18 +683,26 @@ def add_student():
         }), 500
 
 @app.errorhandler(401)
-def unauthorized(error):
+async def unauthorized(error):
     return jsonify({'error': 'Unauthorized: Invalid or missing admin token'}), 401
 
 @app.errorhandler(413)
-def too_large(error):
+async def too_large(error):
     return jsonify({'error': 'File too large'}), 413
 
+@app.before_serving
+async def startup():
+    """Initialize face recognition engine before serving requests"""
+    await asyncio.to_thread(init_face_engine)
+    recognition_coalescer.start()
+
+@app.after_serving
+async def shutdown():
+    """Stop background tasks on shutdown"""
+    await recognition_coalescer.stop()
+
 if __name__ == '__main__':
-    # Initialize face recognition engine on startup
-    init_face_engine()
-    
-    # Run Flask app
+    # Run Quart app (use `uvicorn app:app` in production)
     app.run(
         debug=Config.DEBUG,
         host='0.0.0.0',
@@ -11,6 +11,9 @@ class Config:
     # Face recognition settings
     FACE_RECOGNITION_THRESHOLD = float(os.getenv('FACE_RECOGNITION_THRESHOLD', '0.45'))  # Slightly increased for better tolerance to appearance changes
     FACE_RECOGNITION_MODEL = os.getenv('FACE_RECOGNITION_MODEL', 'large')  # small, large
+    # Re-run detection with a fallback model when the first pass finds
+    # nothing; each retry costs a full detector run
+    RETRY_DETECTION = os.getenv('RETRY_DETECTION', 'false').lower() == 'true'
     
     # Admin settings
     ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', 'admin_secret_token_2023')
@@ -27,10 +30,20 @@ class Config:
     # Performance settings
     USE_FAISS = os.getenv('USE_FAISS', 'false').lower() == 'true'
     USE_ANNOY = os.getenv('USE_ANNOY', 'false').lower() == 'true'
+    # int8-quantized search index (8x smaller, needs simsimd installed)
+    USE_INT8_EMBEDDINGS = os.getenv('USE_INT8_EMBEDDINGS', 'false').lower() == 'true'
+
+    # Recognition micro-batching (coalesce concurrent queries into one search)
+    RECOGNIZE_BATCH_MAX = int(os.getenv('RECOGNIZE_BATCH_MAX', '32'))
+    RECOGNIZE_BATCH_WINDOW_MS = float(os.getenv('RECOGNIZE_BATCH_WINDOW_MS', '10'))
     
     # Embedding cache
     EMBEDDINGS_CACHE_PATH = os.getenv('EMBEDDINGS_CACHE_PATH', 'data/embeddings.npy')
     EMBEDDINGS_METADATA_PATH = os.getenv('EMBEDDINGS_METADATA_PATH', 'data/embeddings_metadata.json')
+    EMBEDDINGS_I8_CACHE_PATH = os.getenv('EMBEDDINGS_I8_CACHE_PATH', 'data/embeddings_i8.npy')
+    # Append-only columnar encoding store (raw float32 rows + int64 ids)
+    ENCODINGS_STORE_PATH = os.getenv('ENCODINGS_STORE_PATH', 'data/encodings.f32')
+    STUDENT_IDS_STORE_PATH = os.getenv('STUDENT_IDS_STORE_PATH', 'data/student_ids.i64')
     
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
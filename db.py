@@ -1,5 +1,5 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, scoped_session
 from models import Base
 from config import Config
 import logging
@@ -8,11 +8,35 @@ import logging
 logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL))
 logger = logging.getLogger(__name__)
 
-# Create engine
-engine = create_engine(Config.DATABASE_URL, echo=Config.DEBUG)
+# Create engine; SQLite gets WAL + shared-thread access, server databases
+# get a pool sized for concurrent recognize traffic
+if Config.DATABASE_URL.startswith('sqlite'):
+    engine = create_engine(
+        Config.DATABASE_URL,
+        echo=Config.DEBUG,
+        connect_args={'check_same_thread': False}
+    )
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Enable WAL so concurrent readers don't block the writer"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+else:
+    engine = create_engine(
+        Config.DATABASE_URL,
+        echo=Config.DEBUG,
+        pool_size=20,
+        max_overflow=40,
+        pool_pre_ping=True,
+        pool_recycle=1800
+    )
+
+# Thread-scoped session factory: repeated get_db_session() calls on the same
+# thread reuse one session instead of allocating a fresh one per call
+SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
 
 def init_db():
     """Initialize database tables"""
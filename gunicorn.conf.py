@@ -0,0 +1,22 @@
+"""
+Gunicorn configuration for production deployments
+
+Run with: gunicorn -c gunicorn.conf.py app:app
+
+The built-in `python app.py` server is single-process and only suitable
+for local debugging.
+"""
+import multiprocessing
+
+# Quart is an ASGI app, so serve it through uvicorn's gunicorn worker;
+# each worker runs its own event loop handling many in-flight requests
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = 2 * multiprocessing.cpu_count() + 1
+
+bind = '0.0.0.0:5000'
+
+# Camera clients post frames in bursts; keep connections open between them
+keepalive = 5
+
+# Excel loads and index rebuilds can take a while
+timeout = 120
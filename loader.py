@@ -1,17 +1,63 @@
-import pandas as pd
 import os
 import logging
 import click
 import json
-import pickle
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from config import Config
 from models import Student, LoadSession
 from db import get_db_session
-from face_utils import face_engine
+
+# pandas and face_utils (which drags in dlib - hundreds of MB, seconds
+# of import time) are imported lazily inside the functions that need
+# them, so --help, validation and --dry-run start instantly
 
 logger = logging.getLogger(__name__)
 
+def _encode_one(image_path):
+    """
+    Extract one face encoding in a worker process
+    Module-level so ProcessPoolExecutor can pickle it
+    """
+    from face_utils import face_engine
+    return face_engine.extract_face_encoding(image_path)
+
+def _dlib_cuda_available():
+    """Whether dlib was built with CUDA (enables batched GPU detection)"""
+    try:
+        import dlib
+        return bool(dlib.DLIB_USE_CUDA)
+    except Exception:
+        return False
+
+def _encode_paths_gpu(paths, batch_size=32):
+    """
+    Decode images in groups of batch_size and push them through the
+    engine's batched CNN detector; returns one (encoding, num_faces)
+    per path, (None, 0) for unreadable images
+    """
+    import face_recognition
+    from face_utils import face_engine
+
+    results = []
+    for start in range(0, len(paths), batch_size):
+        chunk = paths[start:start + batch_size]
+        images = []
+        decode_ok = []
+        for path in chunk:
+            try:
+                images.append(face_recognition.load_image_file(path))
+                decode_ok.append(True)
+            except Exception as e:
+                logger.error(f"Failed to read image {path}: {e}")
+                decode_ok.append(False)
+
+        chunk_results = iter(face_engine.extract_face_encodings_batch(images, batch_size=batch_size))
+        results.extend(next(chunk_results) if ok else (None, 0) for ok in decode_ok)
+
+    return results
+
 class ExcelLoader:
     def __init__(self):
         self.required_columns = [
@@ -54,11 +100,58 @@ class ExcelLoader:
         
         return None
     
+    def dry_run(self, excel_path):
+        """
+        Validate Excel structure and resolve image paths without touching
+        the database or importing dlib
+        Returns: (total_rows, resolvable_rows, problems)
+        """
+        import pandas as pd
+
+        if not os.path.exists(excel_path):
+            raise FileNotFoundError(f"Excel file not found: {excel_path}")
+
+        try:
+            df = pd.read_excel(excel_path, engine='calamine')
+        except (ImportError, ValueError):
+            # ValueError: pandas < 2.2 doesn't know the calamine engine
+            df = pd.read_excel(excel_path)
+
+        self.validate_excel_structure(df)
+
+        clean = {
+            col: df[col].astype('string').str.strip().fillna('')
+            for col in self.required_columns
+        }
+
+        problems = []
+        resolvable = 0
+        for index in range(len(df)):
+            if not clean['Matricula'].iat[index] and not clean['Идентификатор'].iat[index]:
+                problems.append(f"Row {index+2}: Missing both Matricula and Идентификатор")
+                continue
+
+            file_path = clean['File path'].iat[index]
+            if not file_path:
+                problems.append(f"Row {index+2}: Missing file path")
+                continue
+
+            if not self.resolve_image_path(file_path):
+                problems.append(f"Row {index+2}: Image file not found: {file_path}")
+                continue
+
+            resolvable += 1
+
+        return len(df), resolvable, problems
+
     def load_from_excel(self, excel_path, force=False):
         """
         Load students from Excel file
         Returns: LoadSession object with results
         """
+        import pandas as pd
+        from face_utils import face_engine, serialize_encoding
+
         db = get_db_session()
         
         # Create load session
@@ -80,118 +173,210 @@ class ExcelLoader:
             if not os.path.exists(excel_path):
                 raise FileNotFoundError(f"Excel file not found: {excel_path}")
             
-            df = pd.read_excel(excel_path)
+            # python-calamine parses .xlsx several times faster than the
+            # default openpyxl engine; fall back when it isn't installed
+            # or pandas predates 2.2 and rejects the engine name
+            try:
+                df = pd.read_excel(excel_path, engine='calamine')
+            except (ImportError, ValueError):
+                df = pd.read_excel(excel_path)
             logger.info(f"Loaded Excel with {len(df)} rows")
             
             # Validate structure
             self.validate_excel_structure(df)
-            
-            # Process each row
-            for index, row in df.iterrows():
+
+            # Coerce every column once in vectorized pandas code instead
+            # of pd.notna + str().strip() per cell inside the row loop;
+            # missing cells become '' like the old per-cell path produced
+            clean = {
+                col: df[col].astype('string').str.strip().fillna('')
+                for col in self.required_columns
+            }
+
+            # Prefetch existing keys once so the per-row existence check
+            # is a dict hit instead of up to two SELECTs
+            existing_by_matricula = {}
+            existing_by_identifier = {}
+            for sid, existing_matricula, existing_identifier in \
+                    db.query(Student.id, Student.matricula, Student.identifier).all():
+                if existing_matricula:
+                    existing_by_matricula[existing_matricula] = sid
+                if existing_identifier:
+                    existing_by_identifier[existing_identifier] = sid
+
+            # First pass: validate rows, dedupe and resolve image paths.
+            # No dlib work happens here, so it's quick even for big files.
+            pending = []
+            seen_matriculas = set()
+            seen_identifiers = set()
+            for index in range(len(df)):
                 records_processed += 1
-                
-                try:
-                    # Check for required fields
-                    matricula = str(row['Matricula']).strip() if pd.notna(row['Matricula']) else ''
-                    identifier = str(row['Идентификатор']).strip() if pd.notna(row['Идентификатор']) else ''
-                    
-                    if not matricula and not identifier:
-                        error_msg = f"Row {index+2}: Missing both Matricula and Идентификатор"
-                        logger.warning(error_msg)
-                        errors.append(error_msg)
-                        records_skipped += 1
-                        continue
-                    
-                    # Check if student already exists
-                    existing_student = None
-                    if matricula:
-                        existing_student = db.query(Student).filter_by(matricula=matricula).first()
-                    if not existing_student and identifier:
-                        existing_student = db.query(Student).filter_by(identifier=identifier).first()
-                    
-                    if existing_student and not force:
-                        logger.info(f"Row {index+2}: Student already exists (matricula={matricula}, identifier={identifier})")
-                        records_skipped += 1
-                        continue
-                    
-                    # Resolve image path
-                    file_path = str(row['File path']).strip() if pd.notna(row['File path']) else ''
-                    if not file_path:
-                        error_msg = f"Row {index+2}: Missing file path"
-                        logger.warning(error_msg)
-                        errors.append(error_msg)
-                        records_skipped += 1
-                        continue
-                    
-                    resolved_path = self.resolve_image_path(file_path)
-                    if not resolved_path:
-                        error_msg = f"Row {index+2}: Image file not found: {file_path}"
-                        logger.warning(error_msg)
-                        errors.append(error_msg)
-                        records_skipped += 1
-                        continue
-                    
-                    # Extract face encoding
-                    encoding, num_faces = face_engine.extract_face_encoding(resolved_path)
-                    if encoding is None:
-                        error_msg = f"Row {index+2}: No face found in image: {resolved_path}"
-                        logger.warning(error_msg)
-                        errors.append(error_msg)
-                        records_skipped += 1
-                        continue
-                    
-                    if num_faces > 1:
-                        warning_msg = f"Row {index+2}: Multiple faces found ({num_faces}), using first one"
-                        logger.warning(warning_msg)
-                        errors.append(warning_msg)
-                    
-                    # Prepare student data
-                    student_data = {
-                        'matricula': matricula or None,
-                        'lastname': str(row['Lastname']).strip() if pd.notna(row['Lastname']) else '',
-                        'firstname': str(row['Firstname']).strip() if pd.notna(row['Firstname']) else '',
-                        'lotin': str(row['Lotin']).strip() if pd.notna(row['Lotin']) else None,
-                        'short': str(row['Short']).strip() if pd.notna(row['Short']) else None,
-                        'group_name': str(row['Group']).strip() if pd.notna(row['Group']) else None,
-                        'identifier': identifier or None,
-                        'date_of_birth': str(row['Date of birth']).strip() if pd.notna(row['Date of birth']) else None,
-                        'passport_number': str(row['Passport number']).strip() if pd.notna(row['Passport number']) else None,
-                        'file_path': resolved_path,
-                        'face_encoding': pickle.dumps(encoding),
-                        'updated_at': datetime.utcnow()
-                    }
-                    
-                    # Create or update student
-                    if existing_student and force:
-                        # Update existing
-                        for key, value in student_data.items():
-                            setattr(existing_student, key, value)
-                        logger.info(f"Row {index+2}: Updated student {matricula or identifier}")
-                    else:
-                        # Create new
-                        student = Student(**student_data)
-                        db.add(student)
-                        logger.info(f"Row {index+2}: Added student {matricula or identifier}")
-                    
-                    records_added += 1
-                    
-                    # Commit every 50 records
-                    if records_processed % 50 == 0:
-                        db.commit()
-                        logger.info(f"Processed {records_processed} records...")
-                
-                except Exception as e:
-                    error_msg = f"Row {index+2}: Error processing record: {str(e)}"
-                    logger.error(error_msg)
+
+                # Check for required fields
+                matricula = clean['Matricula'].iat[index]
+                identifier = clean['Идентификатор'].iat[index]
+
+                if not matricula and not identifier:
+                    error_msg = f"Row {index+2}: Missing both Matricula and Идентификатор"
+                    logger.warning(error_msg)
                     errors.append(error_msg)
                     records_skipped += 1
-                    # Reset session state after database errors (e.g., UNIQUE constraint violations)
-                    db.rollback()
                     continue
-            
-            # Final commit
+
+                # Duplicate keys within the file would break the bulk
+                # insert's UNIQUE constraints; first occurrence wins
+                if (matricula and matricula in seen_matriculas) or \
+                        (identifier and identifier in seen_identifiers):
+                    error_msg = f"Row {index+2}: Duplicate Matricula/Идентификатор within the file"
+                    logger.warning(error_msg)
+                    errors.append(error_msg)
+                    records_skipped += 1
+                    continue
+
+                # Check if student already exists
+                existing_id = existing_by_matricula.get(matricula) if matricula else None
+                if existing_id is None and identifier:
+                    existing_id = existing_by_identifier.get(identifier)
+
+                if existing_id is not None and not force:
+                    logger.info(f"Row {index+2}: Student already exists (matricula={matricula}, identifier={identifier})")
+                    records_skipped += 1
+                    continue
+
+                # Resolve image path
+                file_path = clean['File path'].iat[index]
+                if not file_path:
+                    error_msg = f"Row {index+2}: Missing file path"
+                    logger.warning(error_msg)
+                    errors.append(error_msg)
+                    records_skipped += 1
+                    continue
+
+                resolved_path = self.resolve_image_path(file_path)
+                if not resolved_path:
+                    error_msg = f"Row {index+2}: Image file not found: {file_path}"
+                    logger.warning(error_msg)
+                    errors.append(error_msg)
+                    records_skipped += 1
+                    continue
+
+                pending.append((index, matricula, identifier, existing_id, resolved_path))
+                if matricula:
+                    seen_matriculas.add(matricula)
+                if identifier:
+                    seen_identifiers.add(identifier)
+
+            # Extract face encodings across all cores: dlib detection +
+            # encoding dominates the load time and each image is
+            # independent, so a process pool scales near-linearly
+            if pending:
+                paths = [item[4] for item in pending]
+                if _dlib_cuda_available():
+                    # The batched CNN detector on GPU beats any number of
+                    # CPU workers, so prefer it when dlib has CUDA
+                    logger.info(f"Extracting encodings for {len(paths)} images on GPU...")
+                    encoding_results = _encode_paths_gpu(paths)
+                else:
+                    logger.info(f"Extracting encodings for {len(paths)} images "
+                                f"on {os.cpu_count()} workers...")
+                    # Spawn, not the Linux fork default: this also runs
+                    # inside the Quart server via asyncio.to_thread, and
+                    # forking a multithreaded process holding an event
+                    # loop and logging locks can deadlock
+                    with ProcessPoolExecutor(
+                        max_workers=os.cpu_count(),
+                        mp_context=multiprocessing.get_context('spawn')
+                    ) as executor:
+                        encoding_results = list(executor.map(
+                            _encode_one,
+                            paths,
+                            chunksize=8
+                        ))
+            else:
+                encoding_results = []
+
+            # Second pass: accumulate row dicts, no DB calls in the loop
+            new_rows = []
+            updates = []
+            new_encodings = []      # (matricula, identifier, encoding) for new rows
+            updated_encodings = []  # (student_id, encoding) for force-updates
+            for (index, matricula, identifier, existing_id, resolved_path), \
+                    (encoding, num_faces) in zip(pending, encoding_results):
+                if encoding is None:
+                    error_msg = f"Row {index+2}: No face found in image: {resolved_path}"
+                    logger.warning(error_msg)
+                    errors.append(error_msg)
+                    records_skipped += 1
+                    continue
+
+                if num_faces > 1:
+                    warning_msg = f"Row {index+2}: Multiple faces found ({num_faces}), using first one"
+                    logger.warning(warning_msg)
+                    errors.append(warning_msg)
+
+                # Prepare student data
+                student_data = {
+                    'matricula': matricula or None,
+                    'lastname': clean['Lastname'].iat[index],
+                    'firstname': clean['Firstname'].iat[index],
+                    'lotin': clean['Lotin'].iat[index] or None,
+                    'short': clean['Short'].iat[index] or None,
+                    'group_name': clean['Group'].iat[index] or None,
+                    'identifier': identifier or None,
+                    'date_of_birth': clean['Date of birth'].iat[index] or None,
+                    'passport_number': clean['Passport number'].iat[index] or None,
+                    'file_path': resolved_path,
+                    'face_encoding': serialize_encoding(encoding),
+                    'updated_at': datetime.utcnow()
+                }
+
+                if existing_id is not None and force:
+                    updates.append(dict(student_data, id=existing_id))
+                    updated_encodings.append((existing_id, encoding))
+                    logger.info(f"Row {index+2}: Updating student {matricula or identifier}")
+                else:
+                    new_rows.append(student_data)
+                    new_encodings.append((matricula or None, identifier or None, encoding))
+                    logger.info(f"Row {index+2}: Adding student {matricula or identifier}")
+
+                records_added += 1
+
+            # One Core multi-row INSERT plus one bulk UPDATE instead of
+            # a unit-of-work flush per student
+            if new_rows:
+                db.execute(Student.__table__.insert(), new_rows)
+            if updates:
+                db.bulk_update_mappings(Student, updates)
             db.commit()
-            
+
+            # Mirror the new encodings into the columnar store so the
+            # index rebuild below reads one sequential file instead of
+            # scanning the students table. Core inserts don't hand back
+            # ids, so resolve them with one keyed query
+            saved_ids = []
+            saved_encs = []
+            if new_encodings:
+                id_by_matricula = dict(
+                    db.query(Student.matricula, Student.id)
+                    .filter(Student.matricula.isnot(None)).all()
+                )
+                id_by_identifier = dict(
+                    db.query(Student.identifier, Student.id)
+                    .filter(Student.identifier.isnot(None)).all()
+                )
+                for row_matricula, row_identifier, encoding in new_encodings:
+                    sid = id_by_matricula.get(row_matricula) if row_matricula else None
+                    if sid is None and row_identifier:
+                        sid = id_by_identifier.get(row_identifier)
+                    if sid is not None:
+                        saved_ids.append(sid)
+                        saved_encs.append(encoding)
+            for sid, encoding in updated_encodings:
+                saved_ids.append(sid)
+                saved_encs.append(encoding)
+            if saved_ids:
+                face_engine.append_to_encoding_store(saved_ids, saved_encs)
+
             # Update load session
             load_session.records_processed = records_processed
             load_session.records_added = records_added
@@ -210,6 +395,10 @@ class ExcelLoader:
             return load_session
             
         except Exception as e:
+            # Reset session state (e.g., after a failed bulk insert)
+            # before recording the failure
+            db.rollback()
+
             # Update load session with error
             load_session.errors = json.dumps(errors + [f"Fatal error: {str(e)}"])
             load_session.completed_at = datetime.utcnow()
@@ -229,14 +418,30 @@ class ExcelLoader:
 @click.command()
 @click.option('--excel-path', default=Config.EXCEL_FILE_PATH, help='Path to Excel file')
 @click.option('--force', is_flag=True, help='Overwrite existing records')
+@click.option('--dry-run', is_flag=True, help='Validate structure and image paths without loading')
 @click.option('--verbose', '-v', is_flag=True, help='Verbose output')
-def load_excel_cli(excel_path, force, verbose):
+def load_excel_cli(excel_path, force, dry_run, verbose):
     """Load students from Excel file via CLI"""
     if verbose:
         logging.basicConfig(level=logging.INFO)
-    
+
     try:
         loader = ExcelLoader()
+
+        if dry_run:
+            total, resolvable, problems = loader.dry_run(excel_path)
+            print(f"\nDry Run Summary:")
+            print(f"File: {excel_path}")
+            print(f"Rows: {total}")
+            print(f"Rows with resolvable images: {resolvable}")
+            if problems:
+                print(f"\nProblems ({len(problems)}):")
+                for problem in problems[:10]:  # Show first 10 problems
+                    print(f"  - {problem}")
+                if len(problems) > 10:
+                    print(f"  ... and {len(problems) - 10} more")
+            return
+
         load_session = loader.load_from_excel(excel_path, force=force)
         
         print(f"\nLoad Summary:")
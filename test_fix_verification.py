@@ -1,103 +1,68 @@
 #!/usr/bin/env python3
 """
 Simple test to verify the fix is correctly applied in loader.py
-This checks that the rollback line was added to the exception handler
+This checks that the rollback line is present in the exception handler
 """
+import mmap
 import re
 
-def test_loader_fix():
+# Compiled once at module load; bytes pattern so it can run over the
+# mmap without decoding the whole file
+_PAT_HANDLER = re.compile(rb'except Exception as e:')
+
+def test_loader_fix(mm):
     """Test that the rollback fix is present in loader.py"""
     print("Verifying that the fix is applied in loader.py...")
-    
+
     try:
-        with open('loader.py', 'r') as f:
-            content = f.read()
-        
-        # Look for the exception handler pattern
-        exception_pattern = r'except Exception as e:(.*?)continue'
-        matches = re.findall(exception_pattern, content, re.DOTALL)
-        
-        if not matches:
-            print("❌ Could not find exception handler in loader.py")
-            return False
-        
-        # Check if rollback is present in the exception handler
-        exception_handler = matches[0]
-        
-        if 'db.rollback()' in exception_handler:
+        # The rollback must appear inside a handler's own body, so check
+        # a bounded window after each handler rather than letting a
+        # DOTALL match run into an unrelated handler hundreds of lines
+        # later
+        for match in _PAT_HANDLER.finditer(mm):
+            window = mm[match.end():match.end() + 400]
+            rollback_at = window.find(b'db.rollback()')
+            if rollback_at == -1:
+                continue
+
             print("✅ Fix verified: db.rollback() found in exception handler")
-            
-            # Show the fixed code block
+
+            # Show the handler body up to the rollback (decode only the
+            # matched slice)
             print("\nFixed exception handler:")
-            lines = exception_handler.strip().split('\n')
-            for line in lines:
+            body = window[:rollback_at + len(b'db.rollback()')]
+            for line in body.decode('utf-8').strip().split('\n'):
                 print(f"    {line.strip()}")
-            
+
             return True
-        else:
-            print("❌ Fix not found: db.rollback() is missing from exception handler")
-            print("\nCurrent exception handler:")
-            lines = exception_handler.strip().split('\n')
-            for line in lines:
-                print(f"    {line.strip()}")
-            return False
-        
-    except FileNotFoundError:
-        print("❌ loader.py not found")
+
+        print("❌ Fix not found: no exception handler with db.rollback() in loader.py")
         return False
+
     except Exception as e:
-        print(f"❌ Error reading loader.py: {e}")
+        print(f"❌ Error scanning loader.py: {e}")
         return False
 
-def test_fix_placement():
+def test_fix_placement(mm):
     """Test that the fix is in the correct location"""
     print("\nVerifying fix placement...")
-    
+
     try:
-        with open('loader.py', 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        # Find the exception handler
-        for i, line in enumerate(lines):
-            if 'except Exception as e:' in line:
-                # Check the next few lines for the expected structure
-                expected_sequence = [
-                    'error_msg = f"Row {index+2}: Error processing record: {str(e)}"',
-                    'logger.error(error_msg)',
-                    'errors.append(error_msg)',
-                    'records_skipped += 1',
-                    'db.rollback()',
-                    'continue'
-                ]
-                
-                found_lines = []
-                for j in range(i+1, min(i+8, len(lines))):
-                    line_content = lines[j].strip()
-                    if line_content:
-                        found_lines.append(line_content)
-                
-                print(f"Exception handler found at line {i+1}")
-                print("Expected sequence:")
-                for seq in expected_sequence:
-                    print(f"  - {seq}")
-                
-                print("\nActual sequence:")
-                for line in found_lines:
-                    print(f"  - {line}")
-                
-                # Check if rollback is present
-                rollback_found = any('db.rollback()' in line for line in found_lines)
-                
-                if rollback_found:
-                    print("✅ db.rollback() found in correct location")
-                    return True
-                else:
-                    print("❌ db.rollback() not found in exception handler")
-                    return False
-        
-        print("❌ Exception handler not found")
+        # mm.find jumps straight to each handler instead of enumerating
+        # every line; the rollback must sit inside the handler body
+        pos = mm.find(b'except Exception as e:')
+        while pos != -1:
+            window = mm[pos:pos + 400]
+            if b'db.rollback()' in window:
+                line_number = mm[:pos].count(b'\n') + 1
+                print(f"Exception handler found at line {line_number}")
+                print("✅ db.rollback() found in correct location")
+                return True
+            pos = mm.find(b'except Exception as e:', pos + 1)
+
+        print("❌ db.rollback() not found in any exception handler")
         return False
-        
+
     except Exception as e:
         print(f"❌ Error analyzing fix placement: {e}")
         return False
@@ -106,10 +71,21 @@ def main():
     """Run all verification tests"""
     print("Loader Fix Verification")
     print("=" * 40)
-    
-    success1 = test_loader_fix()
-    success2 = test_fix_placement()
-    
+
+    # Read the file once and share the zero-copy mapping between tests
+    try:
+        with open('loader.py', 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        print("❌ loader.py not found")
+        return
+
+    try:
+        success1 = test_loader_fix(mm)
+        success2 = test_fix_placement(mm)
+    finally:
+        mm.close()
+
     print("\n" + "=" * 40)
     if success1 and success2:
         print("✅ Fix verification PASSED!")
@@ -117,11 +93,11 @@ def main():
     else:
         print("❌ Fix verification FAILED!")
         print("The fix may not be applied correctly.")
-    
+
     print("\nExpected behavior after fix:")
-    print("- When a UNIQUE constraint error occurs, the session will be rolled back")
+    print("- When a database error occurs, the session will be rolled back")
     print("- Subsequent database operations will continue normally")
     print("- No more cascading 'session has been rolled back' errors")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
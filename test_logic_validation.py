@@ -102,17 +102,29 @@ def test_modal_logic():
         }
     ]
     
-    for i, case in enumerate(test_cases):
-        print(f"Test case {i+1}: {case['status']}")
-        
-        if case['status'] == 'ok':
-            print(f"  ✅ Would show modal for first-time visit: {case['student']['firstname']} {case['student']['lastname']}")
-            print(f"  ✅ Pass time: {case['pass_time']}")
-        elif case['status'] == 'already_passed':
-            print(f"  ⚠️ Would show modal for repeat visit: {case['student']['firstname']} {case['student']['lastname']}")
-            print(f"  ⚠️ First pass time: {case['first_pass_time']}")
-        
-        print(f"  📊 Confidence: {case['confidence']}")
+    # Pull every value out of the nested dicts once; the print loop then
+    # works on flat positional tuples instead of re-resolving dict keys
+    # inside each f-string
+    rendered = [
+        (case['status'],
+         case['student']['firstname'],
+         case['student']['lastname'],
+         case.get('pass_time') or case.get('first_pass_time'),
+         case['confidence'])
+        for case in test_cases
+    ]
+
+    for i, (status, firstname, lastname, pass_time, confidence) in enumerate(rendered):
+        print("Test case %d: %s" % (i + 1, status))
+
+        if status == 'ok':
+            print("  ✅ Would show modal for first-time visit: %s %s" % (firstname, lastname))
+            print("  ✅ Pass time: %s" % pass_time)
+        elif status == 'already_passed':
+            print("  ⚠️ Would show modal for repeat visit: %s %s" % (firstname, lastname))
+            print("  ⚠️ First pass time: %s" % pass_time)
+
+        print("  📊 Confidence: %s" % confidence)
     
     print("✅ Modal logic would handle both first-time and repeat visits")
     return True
@@ -3,6 +3,7 @@ Simple test script to verify basic structure without heavy dependencies
 """
 import os
 import sqlite3
+import sys
 from datetime import datetime
 
 def test_basic_structure():
@@ -33,19 +34,33 @@ def test_basic_structure():
         'Face ID docs/photos'
     ]
     
-    print("\nChecking required files:")
+    # One directory walk instead of a stat() syscall per checked path;
+    # membership tests below are O(1) set lookups
+    present_files = set()
+    present_dirs = set()
+    for root, dirs, files in os.walk('.', topdown=True):
+        dirs[:] = [d for d in dirs if d not in ('.git', '__pycache__', 'uploads')]
+        for name in files:
+            present_files.add(os.path.relpath(os.path.join(root, name)))
+        for name in dirs:
+            present_dirs.add(os.path.relpath(os.path.join(root, name)))
+
+    # Collect the per-path results and flush stdout once instead of one
+    # write syscall per print
+    buf = ["\nChecking required files:"]
     for file_path in required_files:
-        if os.path.exists(file_path):
-            print(f"✅ {file_path}")
+        if os.path.normpath(file_path) in present_files:
+            buf.append(f"✅ {file_path}")
         else:
-            print(f"❌ {file_path}")
-    
-    print("\nChecking required directories:")
+            buf.append(f"❌ {file_path}")
+
+    buf.append("\nChecking required directories:")
     for dir_path in required_dirs:
-        if os.path.isdir(dir_path):
-            print(f"✅ {dir_path}/")
+        if os.path.normpath(dir_path) in present_dirs:
+            buf.append(f"✅ {dir_path}/")
         else:
-            print(f"❌ {dir_path}/")
+            buf.append(f"❌ {dir_path}/")
+    sys.stdout.write('\n'.join(buf) + '\n')
 
 def test_config():
     """Test configuration loading"""
@@ -3,24 +3,21 @@
 Test script to reproduce and verify the fix for UNIQUE constraint issue
 This test doesn't require the full dependencies, just simulates the issue
 """
-import os
-import tempfile
 import sqlite3
 from datetime import datetime
 
 def test_unique_constraint_issue():
     """Test to reproduce the UNIQUE constraint issue"""
     print("Testing UNIQUE constraint handling issue...")
-    
-    # Create a temporary database
-    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp_db:
-        db_path = tmp_db.name
-    
+
+    # The test validates constraint semantics, not durability, so an
+    # in-memory database with journaling/fsync off skips all disk I/O
+    conn = sqlite3.connect(':memory:')
+    conn.executescript('PRAGMA journal_mode=MEMORY; PRAGMA synchronous=OFF;')
+
     try:
-        # Create connection and tables
-        conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
-        
+
         # Create students table with UNIQUE constraint
         cursor.execute('''
             CREATE TABLE students (
@@ -33,45 +30,43 @@ def test_unique_constraint_issue():
             )
         ''')
         
-        # Insert first record
-        cursor.execute('''
+        # One prepared statement reused for every insert; executemany
+        # prepares once and binds per row
+        SQL = '''
             INSERT INTO students (matricula, lastname, firstname, identifier, created_at)
             VALUES (?, ?, ?, ?, ?)
-        ''', ('U16108', 'FAYZULLAYEV', 'IBROKHIM', '4908141706.0', datetime.utcnow().isoformat()))
-        
-        conn.commit()
+        '''
+
+        # Insert first record
+        cursor.executemany(SQL, [
+            ('U16108', 'FAYZULLAYEV', 'IBROKHIM', '4908141706.0', datetime.utcnow().isoformat()),
+        ])
         print("✅ First record inserted successfully")
-        
+
         # Try to insert duplicate record (this should fail)
         try:
-            cursor.execute('''
-                INSERT INTO students (matricula, lastname, firstname, identifier, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', ('U16108', 'FAYZULLAYEV', 'IBROKHIM', '4908141706.0', datetime.utcnow().isoformat()))
-            conn.commit()
+            cursor.execute(SQL, ('U16108', 'FAYZULLAYEV', 'IBROKHIM', '4908141706.0', datetime.utcnow().isoformat()))
             print("❌ Duplicate insert should have failed!")
             return False
         except sqlite3.IntegrityError as e:
             print(f"✅ Expected UNIQUE constraint error: {e}")
             # Simulate NOT calling rollback (the bug)
             # In SQLAlchemy, this would put the session in dirty state
-        
+
         # Try to insert a different record (this should work if we handle rollback properly)
         try:
-            cursor.execute('''
-                INSERT INTO students (matricula, lastname, firstname, identifier, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', ('U16109', 'DIFFERENT', 'STUDENT', '4908141707.0', datetime.utcnow().isoformat()))
+            cursor.execute(SQL, ('U16109', 'DIFFERENT', 'STUDENT', '4908141707.0', datetime.utcnow().isoformat()))
+            # Single commit at the end; the intermediate ones added
+            # nothing to what the test verifies
             conn.commit()
             print("✅ Different record inserted successfully after constraint error")
             return True
         except Exception as e:
             print(f"❌ Failed to insert different record after constraint error: {e}")
             return False
-        
+
     finally:
         conn.close()
-        os.unlink(db_path)
 
 def test_sqlalchemy_session_simulation():
     """Simulate the SQLAlchemy session issue"""